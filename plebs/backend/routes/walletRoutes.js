@@ -5,6 +5,9 @@ const router = express.Router();
 
 const walletService = new WalletService();
 
+// Largest array accepted by the batch endpoints
+const MAX_BATCH_SIZE = 100;
+
 // Generate new wallet
 router.post('/generate', async (req, res) => {
     try {
@@ -141,6 +144,47 @@ router.post('/buy', async (req, res) => {
     }
 });
 
+// Buy several tokens in one request; each order succeeds or fails on its own
+router.post('/buy/batch', async (req, res) => {
+    try {
+        const orders = req.body;
+
+        if (!Array.isArray(orders) || orders.length === 0 || orders.length > MAX_BATCH_SIZE) {
+            return res.status(400).json({
+                success: false,
+                error: `Body must be an array of 1-${MAX_BATCH_SIZE} orders`
+            });
+        }
+
+        const settled = await Promise.allSettled(orders.map(order => {
+            const { tokenMint, solAmount, userPublicKey, privateKey, slippageBps } = order || {};
+
+            if (!tokenMint || !solAmount || !userPublicKey || !privateKey) {
+                return Promise.reject(new Error('Missing required fields: tokenMint, solAmount, userPublicKey, privateKey'));
+            }
+
+            return walletService.buyTokenWithSOL(
+                tokenMint,
+                solAmount,
+                userPublicKey,
+                privateKey,
+                slippageBps || 100
+            );
+        }));
+
+        res.json(settled.map(result => (
+            result.status === 'fulfilled'
+                ? result.value
+                : { success: false, error: String(result.reason?.message ?? result.reason) }
+        )));
+    } catch (error) {
+        res.status(500).json({
+            success: false,
+            error: error.message
+        });
+    }
+});
+
 // Sell token for SOL
 router.post('/sell', async (req, res) => {
     try {
@@ -1,6 +1,8 @@
 # bot.py - PLEBS Telegram Bot with Token Analysis & Swapping
-import telebot
+from telebot.async_telebot import AsyncTeleBot
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import json
 import os
 from datetime import datetime
@@ -12,6 +14,13 @@ from telebot import types
 from dotenv import load_dotenv
 import re
 import logging
+import time
+import queue
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 
 load_dotenv()
 
@@ -20,131 +29,401 @@ JUPITER_API_URL = "https://quote-api.jup.ag/v6"
 SOLANA_RPC_URL = os.getenv('SOLANA_RPC_URL', 'https://api.mainnet-beta.solana.com')
 BACKEND_API_URL = os.getenv('BACKEND_API_URL', 'http://localhost:3000/api')
 CHATROOM_URL = os.getenv('CHATROOM_URL', 'https://plebs.chat')
+DB_PATH = os.getenv('DB_PATH', 'plebs_bot.db')
+DB_POOL_SIZE = 4
+WALLET_API_TIMEOUT = 5
+# (connect, read): connect fails fast, but buys/sells wait for on-chain confirmation,
+# so the read outlasts a blockhash expiry (~60-90s) and a slow trade isn't reported as failed
+WALLET_TRADE_TIMEOUT = (WALLET_API_TIMEOUT, 120)
+TOKEN_CACHE_TTL = 15
+TOKEN_CACHE_SIZE = 4096
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 4096
+INTERACTION_FLUSH_INTERVAL = 2
+INTERACTION_BATCH_SIZE = 100
+INTERACTION_QUEUE_MAX = 10000
+FETCH_TIMEOUT = 10
+WALLET_BATCH_SIZE = 100
+# (connect, read): a batch runs up to WALLET_BATCH_SIZE confirmed trades, so once connected
+# wait for the backend rather than abandoning them mid-flight
+WALLET_BATCH_TIMEOUT = (WALLET_API_TIMEOUT, None)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
-def call_wallet_api(endpoint, method='GET', data=None):
+# Keep-alive connection pool for backend wallet calls
+_HTTP = requests.Session()
+_HTTP.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=32))
+_HTTP.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=32))
+
+def _call_wallet_api(endpoint, method='GET', data=None, timeout=WALLET_API_TIMEOUT):
     url = f"{BACKEND_API_URL}/wallet/{endpoint}"
     try:
         if method == 'POST':
-            response = requests.post(url, json=data)
+            response = _HTTP.post(url, json=data, timeout=timeout)
         else:
-            response = requests.get(url)
+            response = _HTTP.get(url, timeout=timeout)
         response.raise_for_status()
         return response.json()
     except Exception as e:
         logging.error(f"Wallet API error at {endpoint}: {e}")
         return None
 
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _never_sent(error: Exception) -> bool:
+    """True if the request failed while connecting, so the backend never saw it"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def _error_message(response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and body.get('error'):
+        return str(body['error'])
+    return f"HTTP {response.status_code}"
+
+def _call_wallet_api_batch(endpoint, items, chunk_size=WALLET_BATCH_SIZE, timeout=WALLET_BATCH_TIMEOUT):
+    """POST items to a batch endpoint, one round-trip per chunk.
+
+    Returns one result per item, in order. Per-item results are whatever
+    the backend reports ({'success': True/False, ...}). If a chunk was
+    rejected outright (4xx) or the backend could not be reached, its
+    items come back with success False. If the request went out but no
+    usable response came back (read error, 5xx, malformed or wrong-length
+    body), the backend may still have executed those items, so they come
+    back with success None: the outcome is unknown and must not be
+    retried blindly.
+    """
+    url = f"{BACKEND_API_URL}/wallet/{endpoint}/batch"
+    results = []
+    for chunk in _chunks(items, chunk_size):
+        try:
+            response = _HTTP.post(url, json=chunk, timeout=timeout)
+        except Exception as e:
+            if _never_sent(e):
+                logging.error(f"Wallet API batch at {endpoint}: backend unreachable, {len(chunk)} items not sent: {e}")
+                results.extend({'success': False, 'error': f"Backend unreachable: {e}"} for _ in chunk)
+            else:
+                logging.error(f"Wallet API batch at {endpoint}: outcome unknown for {len(chunk)} items: {e}")
+                results.extend({'success': None, 'error': f"Outcome unknown: {e}"} for _ in chunk)
+            continue
+        
+        if 400 <= response.status_code < 500:
+            error = _error_message(response)
+            results.extend({'success': False, 'error': error} for _ in chunk)
+            continue
+        
+        try:
+            body = response.json() if response.ok else None
+        except ValueError:
+            body = None
+        if isinstance(body, list) and len(body) == len(chunk):
+            results.extend(body)
+        else:
+            if not response.ok:
+                error = f"Outcome unknown: HTTP {response.status_code}"
+            else:
+                error = f"Outcome unknown: expected {len(chunk)} results in response"
+            logging.error(f"Wallet API batch at {endpoint}: {error}")
+            results.extend({'success': None, 'error': error} for _ in chunk)
+    return results
+
+# Async entry points: the blocking requests calls run in a worker thread so a slow
+# backend never stalls the bot's event loop. Handlers must await these, never the _-prefixed helpers.
+async def call_wallet_api(endpoint, method='GET', data=None, timeout=WALLET_API_TIMEOUT):
+    return await asyncio.to_thread(_call_wallet_api, endpoint, method, data, timeout)
+
+async def call_wallet_api_batch(endpoint, items, chunk_size=WALLET_BATCH_SIZE, timeout=WALLET_BATCH_TIMEOUT):
+    return await asyncio.to_thread(_call_wallet_api_batch, endpoint, items, chunk_size, timeout)
+
 # Example: Generate wallet
-def generate_wallet_for_user():
-    return call_wallet_api('generate', 'POST')
+async def generate_wallet_for_user():
+    return await call_wallet_api('generate', 'POST')
 
 # Example: Buy token
-def buy_token(token_mint, sol_amount, user_public_key, private_key):
+async def buy_token(token_mint, sol_amount, user_public_key, private_key):
     data = {
         'tokenMint': token_mint,
         'solAmount': sol_amount,
         'userPublicKey': user_public_key,
         'privateKey': private_key
     }
-    return call_wallet_api('buy', 'POST', data)
+    return await call_wallet_api('buy', 'POST', data, timeout=WALLET_TRADE_TIMEOUT)
+
+# Example: Buy several tokens in one round-trip
+async def buy_tokens(orders):
+    """orders: iterable of (token_mint, sol_amount, user_public_key, private_key)"""
+    data = [
+        {
+            'tokenMint': token_mint,
+            'solAmount': sol_amount,
+            'userPublicKey': user_public_key,
+            'privateKey': private_key
+        }
+        for token_mint, sol_amount, user_public_key, private_key in orders
+    ]
+    return await call_wallet_api_batch('buy', data)
 
 # Bot configuration
-bot = telebot.TeleBot(BOT_TOKEN)
+bot = AsyncTeleBot(BOT_TOKEN)
 
 # Database setup
+def _open_conn() -> sqlite3.Connection:
+    """Open a long-lived SQLite connection for the pool"""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA cache_size=-20000;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+    """)
+    return conn
+
+# Connections are opened once, on first use, and reused across handlers
+_POOL = queue.LifoQueue()
+_POOL_LOCK = threading.Lock()
+_pool_ready = False
+
+def _fill_pool():
+    global _pool_ready
+    with _POOL_LOCK:
+        if not _pool_ready:
+            for _ in range(DB_POOL_SIZE):
+                _POOL.put(_open_conn())
+            _pool_ready = True
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection for the duration of the block.
+
+    Keep the block to SQL only: load what you need, leave the block, then do
+    Telegram or HTTP calls, so a slow round-trip never pins a pool slot.
+    """
+    if not _pool_ready:
+        _fill_pool()
+    conn = _POOL.get()
+    try:
+        yield conn
+    finally:
+        _POOL.put(conn)
+
+# Hot-path statements; the same text every call, so each pooled connection parses it once
+_USER_COLUMNS = ('telegram_id', 'username', 'wallet_address', 'joined_date', 'is_verified', 'referral_code', 'total_volume')
+
+_Q_GET_USER = f"SELECT {', '.join(_USER_COLUMNS)} FROM users WHERE telegram_id = ?"
+
+_Q_UPSERT_USER = """
+    INSERT INTO users (telegram_id, username, wallet_address)
+    VALUES (?, ?, ?)
+    ON CONFLICT(telegram_id) DO UPDATE SET
+        username = excluded.username,
+        wallet_address = COALESCE(excluded.wallet_address, users.wallet_address)
+    WHERE users.username IS NOT excluded.username
+        OR users.wallet_address IS NOT COALESCE(excluded.wallet_address, users.wallet_address)
+"""
+
+_Q_INSERT_INTERACTION = """
+    INSERT INTO token_interactions (telegram_id, token_address, action, amount, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
 def init_db():
-    conn = sqlite3.connect('plebs_bot.db')
-    c = conn.cursor()
-    
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        telegram_id INTEGER PRIMARY KEY,
-        username TEXT,
-        wallet_address TEXT,
-        joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        is_verified BOOLEAN DEFAULT FALSE,
-        referral_code TEXT,
-        total_volume REAL DEFAULT 0
-    )''')
-    
-    # Token interactions table
-    c.execute('''CREATE TABLE IF NOT EXISTS token_interactions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        telegram_id INTEGER,
-        token_address TEXT,
-        action TEXT,
-        amount REAL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (telegram_id) REFERENCES users (telegram_id)
-    )''')
-    
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        c = conn.cursor()
+        
+        # Users table
+        c.execute('''CREATE TABLE IF NOT EXISTS users (
+            telegram_id INTEGER PRIMARY KEY,
+            username TEXT,
+            wallet_address TEXT,
+            joined_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_verified BOOLEAN DEFAULT FALSE,
+            referral_code TEXT,
+            total_volume REAL DEFAULT 0
+        )''')
+        
+        # Token interactions table
+        c.execute('''CREATE TABLE IF NOT EXISTS token_interactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER,
+            token_address TEXT,
+            action TEXT,
+            amount REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (telegram_id) REFERENCES users (telegram_id)
+        )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_ix_user_ts
+            ON token_interactions (telegram_id, timestamp DESC)''')
+
+# Token interactions are buffered and written in batches by a background thread
+_IX_QUEUE: deque = deque(maxlen=INTERACTION_QUEUE_MAX)
+_IX_WAKE = threading.Event()
+_ix_dropped = 0  # entries discarded since the last successful flush
+
+def _drop_interactions(count: int):
+    """Count discarded entries, warning once when dropping starts rather than per entry"""
+    global _ix_dropped
+    if not _ix_dropped:
+        logging.warning("Token interaction queue full, dropping oldest entries")
+    _ix_dropped += count
+
+def log_interaction(telegram_id: int, token_address: str, action: str, amount: float = 0):
+    """Queue a token interaction for the next batch write, dropping the oldest when full"""
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    if len(_IX_QUEUE) >= INTERACTION_QUEUE_MAX:
+        _drop_interactions(1)
+    _IX_QUEUE.append((telegram_id, token_address, action, amount, timestamp))
+    if len(_IX_QUEUE) >= INTERACTION_BATCH_SIZE:
+        _IX_WAKE.set()
+
+def flush_interactions():
+    """Write all queued interactions in a single transaction"""
+    global _ix_dropped
+    rows = []
+    while _IX_QUEUE:
+        try:
+            rows.append(_IX_QUEUE.popleft())
+        except IndexError:
+            break  # drained concurrently by the other flusher
+    if not rows:
+        return
+    try:
+        with get_conn() as conn:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(_Q_INSERT_INTERACTION, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    except Exception as e:
+        logging.error(f"Error writing {len(rows)} token interactions, will retry: {e}")
+        # Put the rows back in front for the next flush, keeping the newest if there isn't room
+        room = INTERACTION_QUEUE_MAX - len(_IX_QUEUE)
+        kept = rows[len(rows) - room:] if room < len(rows) else rows
+        if len(kept) < len(rows):
+            _drop_interactions(len(rows) - len(kept))
+        _IX_QUEUE.extendleft(reversed(kept))
+        return
+    if _ix_dropped:
+        logging.warning(f"Dropped {_ix_dropped} token interactions while the queue was full")
+        _ix_dropped = 0
+
+def _interaction_writer():
+    while True:
+        _IX_WAKE.wait(INTERACTION_FLUSH_INTERVAL)
+        _IX_WAKE.clear()
+        flush_interactions()
+
+def start_interaction_writer():
+    threading.Thread(target=_interaction_writer, daemon=True).start()
+    atexit.register(flush_interactions)
 
 # Utility functions
+_BASE58_ALPHABET = b'123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
 def is_valid_solana_address(address: str) -> bool:
     """Validate Solana address format"""
-    return len(address) >= 32 and len(address) <= 44 and address.replace('1', '').replace('2', '').replace('3', '').replace('4', '').replace('5', '').replace('6', '').replace('7', '').replace('8', '').replace('9', '').replace('A', '').replace('B', '').replace('C', '').replace('D', '').replace('E', '').replace('F', '').replace('G', '').replace('H', '').replace('J', '').replace('K', '').replace('L', '').replace('M', '').replace('N', '').replace('P', '').replace('Q', '').replace('R', '').replace('S', '').replace('T', '').replace('U', '').replace('V', '').replace('W', '').replace('X', '').replace('Y', '').replace('Z', '').replace('a', '').replace('b', '').replace('c', '').replace('d', '').replace('e', '').replace('f', '').replace('g', '').replace('h', '').replace('i', '').replace('j', '').replace('k', '').replace('m', '').replace('n', '').replace('o', '').replace('p', '').replace('q', '').replace('r', '').replace('s', '').replace('t', '').replace('u', '').replace('v', '').replace('w', '').replace('x', '').replace('y', '').replace('z', '') == ''
+    if not 32 <= len(address) <= 44 or not address.isascii():
+        return False
+    # translate() deletes alphabet bytes via a 256-entry table in C; anything left is invalid
+    return not address.encode('ascii').translate(None, _BASE58_ALPHABET)
+
+# telegram_id -> (expires_at, user or None); cleared by save_user_to_db
+_USER_CACHE: Dict[int, tuple] = {}
 
 def get_user_from_db(telegram_id: int) -> Optional[Dict]:
     """Get user data from database"""
-    conn = sqlite3.connect('plebs_bot.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE telegram_id = ?", (telegram_id,))
-    user = c.fetchone()
-    conn.close()
+    cached = _USER_CACHE.get(telegram_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(_Q_GET_USER, (telegram_id,))
+        user = c.fetchone()
     
     if user:
-        return {
-            'telegram_id': user[0],
-            'username': user[1],
-            'wallet_address': user[2],
-            'joined_date': user[3],
-            'is_verified': user[4],
-            'referral_code': user[5],
-            'total_volume': user[6]
-        }
-    return None
+        user = dict(zip(_USER_COLUMNS, user))
+    
+    _USER_CACHE.pop(telegram_id, None)
+    if len(_USER_CACHE) >= USER_CACHE_SIZE:
+        _USER_CACHE.pop(next(iter(_USER_CACHE)), None)
+    _USER_CACHE[telegram_id] = (time.monotonic() + USER_CACHE_TTL, user)
+    return user
 
 def save_user_to_db(telegram_id: int, username: str, wallet_address: str = None):
     """Save user to database"""
-    conn = sqlite3.connect('plebs_bot.db')
-    c = conn.cursor()
-    c.execute("""
-        INSERT OR REPLACE INTO users (telegram_id, username, wallet_address)
-        VALUES (?, ?, ?)
-    """, (telegram_id, username, wallet_address))
-    conn.commit()
-    conn.close()
-
-async def get_token_info(token_address: str) -> Dict:
+    with get_conn() as conn:
+        c = conn.cursor()
+        # Upsert that only writes when something actually changed
+        c.execute(_Q_UPSERT_USER, (telegram_id, username, wallet_address))
+    _USER_CACHE.pop(telegram_id, None)
+
+# Shared HTTP session for all external lookups (connector, DNS cache and keep-alive reused)
+_SESSION: Optional[aiohttp.ClientSession] = None
+
+async def _session() -> aiohttp.ClientSession:
+    """Return the shared ClientSession, creating it on first use"""
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=64, ttl_dns_cache=300)
+        _SESSION = aiohttp.ClientSession(connector=connector, raise_for_status=False)
+    return _SESSION
+
+async def close_session():
+    """Close the shared ClientSession on shutdown"""
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+
+# token_address -> (expires_at, token_info); pricing moves, so entries are short-lived
+_TOKEN_CACHE: Dict[str, tuple] = {}
+
+def _cache_token_info(token_address: str, token_info: Dict):
+    """Store token info, evicting the oldest entry when full"""
+    _TOKEN_CACHE.pop(token_address, None)
+    if len(_TOKEN_CACHE) >= TOKEN_CACHE_SIZE:
+        _TOKEN_CACHE.pop(next(iter(_TOKEN_CACHE)), None)
+    _TOKEN_CACHE[token_address] = (time.monotonic() + TOKEN_CACHE_TTL, token_info)
+
+async def get_token_info(token_address: str, session: aiohttp.ClientSession) -> Dict:
     """Get comprehensive token information"""
+    cached = _TOKEN_CACHE.get(token_address)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
     try:
         # Get token metadata from Jupiter/DexScreener
-        async with aiohttp.ClientSession() as session:
-            # DexScreener API for token info
-            dex_url = f"https://api.dexscreener.com/latest/dex/tokens/{token_address}"
-            async with session.get(dex_url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('pairs'):
-                        pair = data['pairs'][0]  # Get first pair
-                        return {
-                            'address': token_address,
-                            'name': pair.get('baseToken', {}).get('name', 'Unknown'),
-                            'symbol': pair.get('baseToken', {}).get('symbol', 'Unknown'),
-                            'price_usd': float(pair.get('priceUsd', 0)),
-                            'market_cap': pair.get('marketCap', 0),
-                            'liquidity': pair.get('liquidity', {}).get('usd', 0),
-                            'volume_24h': pair.get('volume', {}).get('h24', 0),
-                            'price_change_24h': pair.get('priceChange', {}).get('h24', 0),
-                            'dex': pair.get('dexId', 'Unknown'),
-                            'pair_address': pair.get('pairAddress', ''),
-                            'url': pair.get('url', '')
-                        }
+        # DexScreener API for token info
+        dex_url = f"https://api.dexscreener.com/latest/dex/tokens/{token_address}"
+        async with session.get(dex_url) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data.get('pairs'):
+                    pair = data['pairs'][0]  # Get first pair
+                    token_info = {
+                        'address': token_address,
+                        'name': pair.get('baseToken', {}).get('name', 'Unknown'),
+                        'symbol': pair.get('baseToken', {}).get('symbol', 'Unknown'),
+                        'price_usd': float(pair.get('priceUsd', 0)),
+                        'market_cap': pair.get('marketCap', 0),
+                        'liquidity': pair.get('liquidity', {}).get('usd', 0),
+                        'volume_24h': pair.get('volume', {}).get('h24', 0),
+                        'price_change_24h': pair.get('priceChange', {}).get('h24', 0),
+                        'dex': pair.get('dexId', 'Unknown'),
+                        'pair_address': pair.get('pairAddress', ''),
+                        'url': pair.get('url', '')
+                    }
+                    _cache_token_info(token_address, token_info)
+                    return token_info
     except Exception as e:
         logging.error(f"Error fetching token info: {e}")
     
@@ -162,14 +441,13 @@ async def get_token_info(token_address: str) -> Dict:
         'url': ''
     }
 
-async def get_chatroom_stats(token_address: str) -> Dict:
+async def get_chatroom_stats(token_address: str, session: aiohttp.ClientSession) -> Dict:
     """Get chatroom statistics for a token"""
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f"{BACKEND_API_URL}/chatroom/stats/{token_address}"
-            async with session.get(url) as response:
-                if response.status == 200:
-                    return await response.json()
+        url = f"{BACKEND_API_URL}/chatroom/stats/{token_address}"
+        async with session.get(url) as response:
+            if response.status == 200:
+                return await response.json()
     except Exception as e:
         logging.error(f"Error fetching chatroom stats: {e}")
     
@@ -180,8 +458,20 @@ async def get_chatroom_stats(token_address: str) -> Dict:
         'room_created': None
     }
 
+async def get_all_data(token_address: str):
+    """Fetch token info and chatroom stats concurrently over the shared session"""
+    session = await _session()
+    return await asyncio.wait_for(
+        asyncio.gather(
+            get_token_info(token_address, session),
+            get_chatroom_stats(token_address, session)
+        ),
+        FETCH_TIMEOUT
+    )
+
+@lru_cache(maxsize=4096)
 def create_token_keyboard(token_address: str) -> types.InlineKeyboardMarkup:
-    """Create interactive keyboard for token actions"""
+    """Create interactive keyboard for token actions (cached; callers must not mutate it)"""
     keyboard = types.InlineKeyboardMarkup(row_width=2)
     
     # Action buttons
@@ -211,53 +501,60 @@ def format_number(num: float) -> str:
     else:
         return f"${num:.2f}"
 
-def format_token_message(token_info: Dict, chatroom_stats: Dict) -> str:
-    """Format comprehensive token information message"""
-    
-    # Price change emoji
-    change_emoji = "🟢" if token_info['price_change_24h'] >= 0 else "🔴"
-    
-    # Security indicators (placeholder - you'd implement actual checks)
-    security_score = "🟢 Safe" if token_info['liquidity'] > 50000 else "🟡 Moderate" if token_info['liquidity'] > 10000 else "🔴 High Risk"
-    
-    message = f"""
-🪙 **{token_info['name']} ({token_info['symbol']})**
+_TOKEN_MSG_TMPL = """
+🪙 **{name} ({symbol})**
 
 💰 **Price Info:**
-├ Price: ${token_info['price_usd']:.6f}
-├ 24h Change: {change_emoji} {token_info['price_change_24h']:.2f}%
-├ Market Cap: {format_number(token_info['market_cap'])}
-└ Liquidity: {format_number(token_info['liquidity'])}
+├ Price: ${price_usd:.6f}
+├ 24h Change: {change_emoji} {price_change_24h:.2f}%
+├ Market Cap: {market_cap}
+└ Liquidity: {liquidity}
 
 📊 **Trading Stats:**
-├ 24h Volume: {format_number(token_info['volume_24h'])}
-├ DEX: {token_info['dex']}
+├ 24h Volume: {volume_24h}
+├ DEX: {dex}
 └ Security: {security_score}
 
 💬 **PLEBS Chatroom:**
-├ Online Now: {chatroom_stats['online_now']} users
-├ Total Messages: {chatroom_stats['total_messages']}
-├ Active Traders: {chatroom_stats['active_users']}
-└ Room Status: {"🟢 Active" if chatroom_stats['online_now'] > 0 else "🟡 Quiet"}
+├ Online Now: {online_now} users
+├ Total Messages: {total_messages}
+├ Active Traders: {active_users}
+└ Room Status: {room_status}
 
-🔗 **Contract:** `{token_info['address']}`
+🔗 **Contract:** `{address}`
 
 *Join our chatroom to discuss this token with other traders and get real-time insights!*
     """
-    
-    return message
 
-# Bot command handlers
-@bot.message_handler(commands=['start'])
-def start_command(message):
-    user_id = message.from_user.id
-    username = message.from_user.username or message.from_user.first_name
+def format_token_message(token_info: Dict, chatroom_stats: Dict) -> str:
+    """Format comprehensive token information message"""
     
-    # Save user if not exists
-    if not get_user_from_db(user_id):
-        save_user_to_db(user_id, username)
+    # Price change emoji
+    change_emoji = "🟢" if token_info['price_change_24h'] >= 0 else "🔴"
     
-    welcome_text = f"""
+    # Security indicators (placeholder - you'd implement actual checks)
+    security_score = "🟢 Safe" if token_info['liquidity'] > 50000 else "🟡 Moderate" if token_info['liquidity'] > 10000 else "🔴 High Risk"
+    
+    return _TOKEN_MSG_TMPL.format(
+        name=token_info['name'],
+        symbol=token_info['symbol'],
+        price_usd=token_info['price_usd'],
+        change_emoji=change_emoji,
+        price_change_24h=token_info['price_change_24h'],
+        market_cap=format_number(token_info['market_cap']),
+        liquidity=format_number(token_info['liquidity']),
+        volume_24h=format_number(token_info['volume_24h']),
+        dex=token_info['dex'],
+        security_score=security_score,
+        online_now=chatroom_stats['online_now'],
+        total_messages=chatroom_stats['total_messages'],
+        active_users=chatroom_stats['active_users'],
+        room_status="🟢 Active" if chatroom_stats['online_now'] > 0 else "🟡 Quiet",
+        address=token_info['address']
+    )
+
+# Static texts and keyboards, built once at import
+_WELCOME_TMPL = """
 🚀 **Welcome to PLEBS - The People's Launchpad!** 
 
 Hey {username}! I'm your gateway to safe and profitable token trading on Solana.
@@ -281,21 +578,15 @@ Your safety is our priority. I'll help you verify tokens and connect with truste
 
 Ready to explore the Solana ecosystem safely? 🌟
     """
-    
-    # Create welcome keyboard
-    keyboard = types.InlineKeyboardMarkup()
-    wallet_btn = types.InlineKeyboardButton("🔗 Connect Wallet", callback_data="connect_wallet")
-    help_btn = types.InlineKeyboardButton("❓ Get Help", callback_data="help")
-    chatroom_btn = types.InlineKeyboardButton("💬 Browse Chatrooms", callback_data="browse_rooms")
-    
-    keyboard.add(wallet_btn)
-    keyboard.add(help_btn, chatroom_btn)
-    
-    bot.send_message(message.chat.id, welcome_text, reply_markup=keyboard, parse_mode='Markdown')
 
-@bot.message_handler(commands=['help'])
-def help_command(message):
-    help_text = """
+_WELCOME_KB = types.InlineKeyboardMarkup()
+_WELCOME_KB.add(types.InlineKeyboardButton("🔗 Connect Wallet", callback_data="connect_wallet"))
+_WELCOME_KB.add(
+    types.InlineKeyboardButton("❓ Get Help", callback_data="help"),
+    types.InlineKeyboardButton("💬 Browse Chatrooms", callback_data="browse_rooms")
+)
+
+_HELP_TEXT = """
 🤖 **PLEBS Bot Commands:**
 
 **Token Analysis:**
@@ -320,11 +611,30 @@ def help_command(message):
 
 **Just paste any token contract address to get started!**
     """
+
+# Bot command handlers
+@bot.message_handler(commands=['start'])
+async def start_command(message):
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.first_name
     
-    bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
+    # Save user if not exists
+    if not get_user_from_db(user_id):
+        save_user_to_db(user_id, username)
+    
+    await bot.send_message(
+        message.chat.id,
+        _WELCOME_TMPL.format(username=username),
+        reply_markup=_WELCOME_KB,
+        parse_mode='Markdown'
+    )
+
+@bot.message_handler(commands=['help'])
+async def help_command(message):
+    await bot.send_message(message.chat.id, _HELP_TEXT, parse_mode='Markdown')
 
 @bot.message_handler(commands=['wallet'])
-def wallet_command(message):
+async def wallet_command(message):
     user_id = message.from_user.id
     user = get_user_from_db(user_id)
     
@@ -348,7 +658,7 @@ Total Volume: {format_number(user['total_volume'])}
 Use the buttons below to manage your wallet:
         """
         
-        bot.send_message(message.chat.id, wallet_text, reply_markup=keyboard, parse_mode='Markdown')
+        await bot.send_message(message.chat.id, wallet_text, reply_markup=keyboard, parse_mode='Markdown')
     else:
         # No wallet connected
         keyboard = types.InlineKeyboardMarkup()
@@ -376,170 +686,149 @@ To start trading, you need to connect a Solana wallet.
 Your keys, your crypto. We never store your private keys.
         """
         
-        bot.send_message(message.chat.id, wallet_text, reply_markup=keyboard, parse_mode='Markdown')
+        await bot.send_message(message.chat.id, wallet_text, reply_markup=keyboard, parse_mode='Markdown')
 
 @bot.message_handler(func=lambda message: True)
-def handle_message(message):
+async def handle_message(message):
     text = message.text.strip()
     
-    # Check if message is a Solana contract address
-    if is_valid_solana_address(text):
-        handle_token_analysis(message, text)
+    # Check if message is a Solana contract address (length check first, it's free)
+    if 32 <= len(text) <= 44 and is_valid_solana_address(text):
+        await handle_token_analysis(message, text)
     else:
         # Handle other messages
-        bot.send_message(
+        await bot.send_message(
             message.chat.id, 
             "🔍 To analyze a token, paste its contract address.\n\nUse /help to see all available commands.",
             parse_mode='Markdown'
         )
 
-def handle_token_analysis(message, token_address: str):
+async def handle_token_analysis(message, token_address: str):
     """Handle token analysis when user sends contract address"""
-    analyzing_msg = bot.send_message(
+    analyzing_msg = await bot.send_message(
         message.chat.id, 
         "🔍 Analyzing token... Please wait a moment.", 
         parse_mode='Markdown'
     )
     try:
-        import asyncio
-        async def get_all_data():
-            token_info = await get_token_info(token_address)
-            chatroom_stats = await get_chatroom_stats(token_address)
-            return token_info, chatroom_stats
-        token_info, chatroom_stats = asyncio.run(get_all_data())
-        bot.delete_message(message.chat.id, analyzing_msg.message_id)
+        token_info, chatroom_stats = await get_all_data(token_address)
+        await bot.delete_message(message.chat.id, analyzing_msg.message_id)
         token_message = format_token_message(token_info, chatroom_stats)
         keyboard = create_token_keyboard(token_address)
-        bot.send_message(
+        await bot.send_message(
             message.chat.id,
             token_message,
             reply_markup=keyboard,
             parse_mode='Markdown'
         )
-        conn = sqlite3.connect('plebs_bot.db')
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO token_interactions (telegram_id, token_address, action, amount)
-            VALUES (?, ?, ?, ?)
-        """, (message.from_user.id, token_address, 'view', 0))
-        conn.commit()
-        conn.close()
+        log_interaction(message.from_user.id, token_address, 'view', 0)
+    except asyncio.TimeoutError:
+        logging.error(f"Timed out analyzing token {token_address}")
+        await bot.delete_message(message.chat.id, analyzing_msg.message_id)
+        await bot.send_message(
+            message.chat.id,
+            "⏱️ Token data is taking too long to load. Please try again in a moment.",
+            parse_mode='Markdown'
+        )
     except Exception as e:
         logging.error(f"Error analyzing token {token_address}: {e}")
-        bot.delete_message(message.chat.id, analyzing_msg.message_id)
-        bot.send_message(
+        await bot.delete_message(message.chat.id, analyzing_msg.message_id)
+        await bot.send_message(
             message.chat.id,
             f"❌ Error analyzing token. Please check the contract address and try again.\n\nError: {str(e)}",
             parse_mode='Markdown'
         )
 
 # Callback handlers for inline keyboards
-def handle_refresh_token(call, token_address: str):
+async def handle_refresh_token(call, token_address: str):
     """Handle refresh token callback by re-analyzing the token and updating the message."""
     try:
-        import asyncio
-        async def get_all_data():
-            token_info = await get_token_info(token_address)
-            chatroom_stats = await get_chatroom_stats(token_address)
-            return token_info, chatroom_stats
-        token_info, chatroom_stats = asyncio.run(get_all_data())
+        token_info, chatroom_stats = await get_all_data(token_address)
         token_message = format_token_message(token_info, chatroom_stats)
         keyboard = create_token_keyboard(token_address)
-        bot.edit_message_text(
+        await bot.edit_message_text(
             token_message,
             call.message.chat.id,
             call.message.message_id,
             reply_markup=keyboard,
             parse_mode='Markdown'
         )
+    except asyncio.TimeoutError:
+        logging.error(f"Timed out refreshing token {token_address}")
+        await bot.answer_callback_query(call.id, "⏱️ Token data is taking too long to load. Please try again.")
     except Exception as e:
         logging.error(f"Error refreshing token {token_address}: {e}")
-        bot.answer_callback_query(call.id, f"❌ Error refreshing token: {str(e)}")
+        await bot.answer_callback_query(call.id, f"❌ Error refreshing token: {str(e)}")
 
 @bot.callback_query_handler(func=lambda call: True)
-def handle_callback(call):
+async def handle_callback(call):
     data = call.data
-    user_id = call.from_user.id
-
-    if data.startswith('buy_'):
-        handle_buy_token(call, data.replace('buy_', ''))
-    elif data.startswith('sell_'):
-        handle_sell_token(call, data.replace('sell_', ''))
-    elif data.startswith('chatroom_'):
-        handle_join_chatroom(call, data.replace('chatroom_', ''))
-    elif data.startswith('refresh_'):
-        handle_refresh_token(call, data.replace('refresh_', ''))
-    elif data == 'connect_wallet':
-        handle_connect_wallet(call)
-    elif data == 'help':
-        help_command(call.message)
+
+    # "<prefix>_<arg>" callbacks first, then exact matches
+    prefix, _, arg = data.partition('_')
+    handler = _PREFIX_ROUTES.get(prefix)
+    if handler:
+        await handler(call, arg)
+        return
+    handler = _EXACT_ROUTES.get(data)
+    if handler:
+        await handler(call)
     # ...existing code...
 
-def handle_buy_token(call, token_address: str):
+# Amount-selection keyboards are serialised once; telebot passes a str reply_markup through as-is
+_TOKEN_SLOT = '{token_address}'
+
+def _amount_keyboard_template(action: str, amounts: list) -> str:
+    """Build the inline keyboard JSON for an amount picker, two buttons per row plus Cancel"""
+    buttons = [
+        {'text': amount, 'callback_data': f"{action}_amount_{_TOKEN_SLOT}_{amount.replace('%', 'pct').replace(' ', '_')}"}
+        for amount in amounts
+    ]
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    rows.append([{'text': '❌ Cancel', 'callback_data': 'cancel'}])
+    return json.dumps({'inline_keyboard': rows})
+
+def _amount_keyboard(template: str, token_address: str) -> str:
+    return template.replace(_TOKEN_SLOT, json.dumps(token_address)[1:-1])
+
+_BUY_KB_TMPL = _amount_keyboard_template('buy', ["0.1 SOL", "0.5 SOL", "1 SOL", "Custom"])
+_SELL_KB_TMPL = _amount_keyboard_template('sell', ["25%", "50%", "100%", "Custom"])
+
+async def handle_buy_token(call, token_address: str):
     """Handle buy token callback"""
     # Check if user has wallet connected
     user = get_user_from_db(call.from_user.id)
     
     if not user or not user['wallet_address']:
-        bot.answer_callback_query(call.id, "❌ Please connect your wallet first!")
+        await bot.answer_callback_query(call.id, "❌ Please connect your wallet first!")
         return
     
-    # Create amount selection keyboard
-    keyboard = types.InlineKeyboardMarkup()
-    amounts = ["0.1 SOL", "0.5 SOL", "1 SOL", "Custom"]
-    
-    for i in range(0, len(amounts), 2):
-        if i + 1 < len(amounts):
-            keyboard.add(
-                types.InlineKeyboardButton(amounts[i], callback_data=f"buy_amount_{token_address}_{amounts[i].replace(' ', '_')}"),
-                types.InlineKeyboardButton(amounts[i+1], callback_data=f"buy_amount_{token_address}_{amounts[i+1].replace(' ', '_')}")
-            )
-        else:
-            keyboard.add(types.InlineKeyboardButton(amounts[i], callback_data=f"buy_amount_{token_address}_{amounts[i].replace(' ', '_')}"))
-    
-    keyboard.add(types.InlineKeyboardButton("❌ Cancel", callback_data="cancel"))
-    
-    bot.edit_message_text(
+    await bot.edit_message_text(
         "💰 **Select Buy Amount:**\n\nChoose how much SOL you want to spend:",
         call.message.chat.id,
         call.message.message_id,
-        reply_markup=keyboard,
+        reply_markup=_amount_keyboard(_BUY_KB_TMPL, token_address),
         parse_mode='Markdown'
     )
 
-def handle_sell_token(call, token_address: str):
+async def handle_sell_token(call, token_address: str):
     """Handle sell token callback"""
     # Check if user has wallet connected
     user = get_user_from_db(call.from_user.id)
     
     if not user or not user['wallet_address']:
-        bot.answer_callback_query(call.id, "❌ Please connect your wallet first!")
+        await bot.answer_callback_query(call.id, "❌ Please connect your wallet first!")
         return
     
-    # Create amount selection keyboard for selling
-    keyboard = types.InlineKeyboardMarkup()
-    amounts = ["25%", "50%", "100%", "Custom"]
-    
-    for i in range(0, len(amounts), 2):
-        if i + 1 < len(amounts):
-            keyboard.add(
-                types.InlineKeyboardButton(amounts[i], callback_data=f"sell_amount_{token_address}_{amounts[i].replace('%', 'pct').replace(' ', '_')}"),
-                types.InlineKeyboardButton(amounts[i+1], callback_data=f"sell_amount_{token_address}_{amounts[i+1].replace('%', 'pct').replace(' ', '_')}")
-            )
-        else:
-            keyboard.add(types.InlineKeyboardButton(amounts[i], callback_data=f"sell_amount_{token_address}_{amounts[i].replace('%', 'pct').replace(' ', '_')}"))
-    
-    keyboard.add(types.InlineKeyboardButton("❌ Cancel", callback_data="cancel"))
-    
-    bot.edit_message_text(
+    await bot.edit_message_text(
         "💸 **Select Sell Amount:**\n\nChoose what percentage of your tokens you want to sell:",
         call.message.chat.id,
         call.message.message_id,
-        reply_markup=keyboard,
+        reply_markup=_amount_keyboard(_SELL_KB_TMPL, token_address),
         parse_mode='Markdown'
     )
 
-def handle_join_chatroom(call, token_address: str):
+async def handle_join_chatroom(call, token_address: str):
     """Handle join chatroom callback"""
     chatroom_url = f"{CHATROOM_URL}/room/{token_address}"
     
@@ -568,7 +857,7 @@ Our chatrooms are moderated and spam-protected.
 Click below to join the conversation!
     """
     
-    bot.edit_message_text(
+    await bot.edit_message_text(
         join_text,
         call.message.chat.id,
         call.message.message_id,
@@ -576,7 +865,7 @@ Click below to join the conversation!
         parse_mode='Markdown'
     )
 
-def handle_connect_wallet(call):
+async def handle_connect_wallet(call):
     """Handle wallet connection"""
     connect_text = """
 🔗 **Connect Your Wallet**
@@ -604,7 +893,7 @@ def handle_connect_wallet(call):
     keyboard.add(import_btn, create_btn)
     keyboard.add(cancel_btn)
     
-    bot.edit_message_text(
+    await bot.edit_message_text(
         connect_text,
         call.message.chat.id,
         call.message.message_id,
@@ -612,9 +901,29 @@ def handle_connect_wallet(call):
         parse_mode='Markdown'
     )
 
+# Callback dispatch tables used by handle_callback
+_PREFIX_ROUTES = {
+    'buy': handle_buy_token,
+    'sell': handle_sell_token,
+    'chatroom': handle_join_chatroom,
+    'refresh': handle_refresh_token,
+}
+
+_EXACT_ROUTES = {
+    'connect_wallet': handle_connect_wallet,
+    'help': lambda call: help_command(call.message),
+}
+
+async def main():
+    try:
+        await bot.polling(non_stop=True)
+    finally:
+        await close_session()
+
 # Initialize database and start bot
 if __name__ == "__main__":
     init_db()
+    start_interaction_writer()
     print("🚀 PLEBS Bot starting...")
     print("🔍 Ready to analyze tokens and connect traders!")
-    bot.polling(non_stop=True)
+    asyncio.run(main())